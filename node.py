@@ -1,6 +1,6 @@
 """
 node.py
-Lamport Distributed Mutual Exclusion simulation using xmlrpc (SimpleRPC).
+Lamport Distributed Mutual Exclusion simulation over a small framed TCP RPC.
 Run this file 3 times (or N times) with different --id values and ports.
 
 Usage example:
@@ -10,198 +10,523 @@ Usage example:
 """
 
 import argparse
+from collections import defaultdict
+import heapq
 import json
+import logging
+import logging.handlers
+import queue
 import threading
 import time
-from xmlrpc.server import SimpleXMLRPCServer
-from xmlrpc.client import ServerProxy
+from concurrent.futures import ThreadPoolExecutor
+import socketserver
+import struct
 import sys
 import os
 from datetime import datetime
+from functools import partial
 import socket
 import random
+from urllib.parse import urlsplit
+
+# ---------------- Wire format ----------------
+# Each frame is a 4-byte big-endian length followed by a binary body:
+#   1 byte  len(from_id), then from_id as UTF-8
+#   n x 9 bytes  (method_id: u8, ts: u64) ops, dispatched in order
+# Decoding is done by precompiled struct.Struct objects, i.e. in C rather
+# than per-byte Python. Frames are one-way: the receiver sends nothing back.
+MSG_REQUEST, MSG_REPLY, MSG_RELEASE = 0, 1, 2
+MSG_NAMES = ("REQUEST", "REPLY", "RELEASE")
+FLUSH_INTERVAL = 0.02
+_LEN = struct.Struct("!I")
+_OP = struct.Struct("!BQ")
+
+def id_prefix(node_id):
+    ident = node_id.encode()
+    return bytes((len(ident),)) + ident
+
+def encode_body(prefix, ops):
+    return prefix + b"".join([_OP.pack(m, ts) for m, ts in ops])
+
+def decode_body(body):
+    n = body[0]
+    return body[1:1 + n].decode(), _OP.iter_unpack(memoryview(body)[1 + n:])
+
+def send_frame(sock, body):
+    sock.sendall(_LEN.pack(len(body)) + body)
+
+def recv_frame(rfile):
+    header = rfile.read(_LEN.size)
+    if len(header) < _LEN.size:
+        return None
+    (n,) = _LEN.unpack(header)
+    body = rfile.read(n)
+    if len(body) < n:
+        return None
+    return body
+
+
+class LamportRequestHandler(socketserver.StreamRequestHandler):
+    # One handler thread serves a peer's persistent connection until it closes
+    def setup(self):
+        super().setup()
+        self.server.track(self.request)
+
+    def finish(self):
+        self.server.untrack(self.request)
+        super().finish()
+
+    def handle(self):
+        node = self.server.node
+        while True:
+            body = recv_frame(self.rfile)
+            if body is None:
+                return
+            try:
+                from_id, ops = decode_body(body)
+                node.receive_batch(ops, from_id)
+            except Exception as e:
+                # A malformed frame is skipped; the connection stays usable
+                node.log(f"Error decoding frame: {e!r}")
+
+
+class LamportTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, addr, node):
+        self.node = node
+        self._conns_lock = threading.Lock()
+        self._conns = {}
+        super().__init__(addr, LamportRequestHandler)
+
+    def track(self, conn):
+        with self._conns_lock:
+            self._conns[conn] = threading.current_thread()
+
+    def untrack(self, conn):
+        with self._conns_lock:
+            self._conns.pop(conn, None)
+
+    def close_connections(self):
+        # shutdown() only stops accepting; end the per-peer handler threads
+        # too and wait for any handler still dispatching a frame
+        with self._conns_lock:
+            conns = list(self._conns.items())
+        for conn, _ in conns:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for _, t in conns:
+            t.join()
+
+
+class SecondCachingFormatter(logging.Formatter):
+    # Log lines only carry whole seconds, so asctime is rendered once per
+    # second and reused for every other record in that second
+    def __init__(self, fmt, datefmt):
+        super().__init__(fmt, datefmt)
+        self._last_sec, self._last_sec_str = None, ""
+
+    def formatTime(self, record, datefmt=None):
+        t = int(record.created)
+        if t != self._last_sec:
+            self._last_sec_str = time.strftime(self.datefmt, time.localtime(t))
+            self._last_sec = t
+        return self._last_sec_str
+
 
 class LamportNode:
     def __init__(self, node_id, url, peers):
         self.node_id = str(node_id)
         self.url = url
-        self.peers = {str(k): v for k, v in peers.items() if str(k) != str(node_id)}
+        self.peers = {str(k): v for k, v in peers.items() if str(k) != self.node_id}
+        # Parsed up front so a bad config entry fails before any thread starts
+        self._peer_addr = {pid: parse_host_port(url, pid) for pid, url in self.peers.items()}
 
-        # Lamport clock
+        # Lamport clock, guarded by queue_lock (see Clock below)
         self.clock = 0
-        self.clock_lock = threading.Lock()
 
-        # Request queue
+        # Request queue: a heap of (ts, node_id). RELEASE only tombstones the
+        # entry; stale entries are popped lazily once they reach the top.
         self.queue_lock = threading.Lock()
         self.request_queue = []
+        self._queued = {}
+        self._tombstones = set()
 
         self.requesting = False
         self.own_request_ts = None
 
-        # Replies and deferred replies
+        # Replies and deferred replies, one bit per peer (bit i = _peer_ids[i])
+        self._peer_ids = sorted(self.peers)
+        self._peer_idx = {pid: i for i, pid in enumerate(self._peer_ids)}
+        self._all_mask = (1 << len(self._peer_ids)) - 1
+
         self.replies_lock = threading.Lock()
-        self.replies_received = set()
+        self._replies_mask = 0
 
         self.deferred_lock = threading.Lock()
-        self.deferred = set()
+        self._deferred_mask = 0
 
-        # Logging
+        # Signalled whenever a REPLY or RELEASE may allow entry to the CS
+        self.cs_cond = threading.Condition()
+
+        # Logging: callers only enqueue records; a QueueListener thread does
+        # the formatting and writes to stdout and the (once-opened) log file
         self.logfile = f"log_node{self.node_id}.txt"
+        self._logger, self._log_listener = self._setup_logger()
         self.ledger_file = "shared_ledger.txt"
-        if not os.path.exists(self.ledger_file):
-            open(self.ledger_file, "w").close()
+        # Opened once with O_APPEND so each ledger record is a single
+        # atomic write, even with other nodes appending to the same file
+        self._ledger_fd = os.open(self.ledger_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+        # One persistent socket per peer, opened lazily and guarded by its own
+        # lock so frames from different threads never interleave
+        self._sockets = {}
+        self._sock_locks = {pid: threading.Lock() for pid in self.peers}
+
+        self._apply_locked = (self._request_locked, self._reply_locked, self._release_locked)
+        self._frame_prefix = id_prefix(self.node_id)
+
+        # Outgoing ops are buffered per peer and coalesced into one frame by
+        # the flusher thread
+        self._outbox_lock = threading.Lock()
+        self._outbox = defaultdict(list)
+        self._broadcast_all = self._compile_broadcast()
+        self._stopping = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+
+        # Broadcasts fan out to all peers concurrently
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.peers)))
 
         self.server = None
         self.server_thread = None
 
     # ---------------- Clock ----------------
+    # The clock shares queue_lock with the request queue, so a tick and the
+    # queue change it goes with cost a single lock acquisition. The _locked
+    # variants expect queue_lock to be held.
+    def _inc_clock_locked(self):
+        self.clock += 1
+        return self.clock
+
+    def _update_clock_locked(self, remote_ts):
+        self.clock = max(self.clock, remote_ts) + 1
+        return self.clock
+
     def inc_clock(self):
-        with self.clock_lock:
-            self.clock += 1
-            return self.clock
+        with self.queue_lock:
+            return self._inc_clock_locked()
 
     def update_clock(self, remote_ts):
-        with self.clock_lock:
-            self.clock = max(self.clock, int(remote_ts)) + 1
-            return self.clock
+        with self.queue_lock:
+            return self._update_clock_locked(remote_ts)
 
     # ---------------- Logging ----------------
+    def _setup_logger(self):
+        formatter = SecondCachingFormatter(
+            f"[%(asctime)s] [Node {self.node_id}] [clock=%(clock)s] %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
+        handlers = [logging.StreamHandler(sys.stdout), logging.FileHandler(self.logfile)]
+        for h in handlers:
+            h.setFormatter(formatter)
+
+        records = queue.Queue()
+        logger = logging.getLogger(f"lamport.node{self.node_id}")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.handlers = [logging.handlers.QueueHandler(records)]
+        listener = logging.handlers.QueueListener(records, *handlers)
+        listener.start()
+        return logger, listener
+
     def log(self, msg):
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        line = f"[{now}] [Node {self.node_id}] [clock={self.clock}] {msg}"
-        print(line)
-        with open(self.logfile, "a") as f:
-            f.write(line + "\n")
+        self._logger.info(msg, extra={"clock": self.clock})
+
+    # ---------------- Request queue ----------------
+    # All helpers below expect queue_lock to be held.
+    def _enqueue_locked(self, ts, node_id):
+        entry = (ts, node_id)
+        self._queued[node_id] = entry
+        heapq.heappush(self.request_queue, entry)
+
+    def _dequeue_locked(self, node_id):
+        entry = self._queued.pop(node_id, None)
+        if entry is not None:
+            self._tombstones.add(entry)
+            # Pop now rather than waiting for our own next request, so stale
+            # entries never pile up under a node that isn't requesting
+            self._queue_head_locked()
+
+    def _queue_head_locked(self):
+        q = self.request_queue
+        while q and q[0] in self._tombstones:
+            self._tombstones.discard(heapq.heappop(q))
+        return q[0] if q else None
+
+    def _queue_snapshot_locked(self):
+        return list(self.request_queue), set(self._tombstones)
+
+    @staticmethod
+    def _queue_view(snapshot):
+        # Sorts a snapshot for logging; call it after releasing queue_lock
+        entries, dead = snapshot
+        return sorted(x for x in entries if x not in dead)
+
+    # ---------------- Peer masks ----------------
+    def _mask_ids(self, mask):
+        ids = []
+        while mask:
+            ids.append(self._peer_ids[(mask & -mask).bit_length() - 1])
+            mask &= mask - 1
+        return ids
 
     # ---------------- RPC Handlers ----------------
-    def receive_request(self, ts, from_id):
-        self.update_clock(ts)
-        with self.queue_lock:
-            self.request_queue.append((int(ts), str(from_id)))
-            self.request_queue.sort()
-
-        self.log(f"Received REQUEST from Node {from_id} (ts={ts}) Queue={self.request_queue}")
-
-        do_reply = False
-        with self.queue_lock:
-            if not self.requesting:
-                do_reply = True
-            else:
-                their = (int(ts), str(from_id))
-                mine = (int(self.own_request_ts), str(self.node_id))
-                if their < mine:
-                    do_reply = True
+    # Each message type has a _locked half that applies its state change
+    # (caller holds queue_lock) and returns the follow-up work (logging,
+    # sending, deferring) to run once the lock is released.
+    def _request_locked(self, ts, from_id):
+        # Clock update, enqueue and the reply decision share one critical section
+        self._update_clock_locked(ts)
+        self._enqueue_locked(ts, from_id)
+        if not self.requesting:
+            do_reply = True
+        else:
+            their = (ts, from_id)
+            mine = (self.own_request_ts, self.node_id)
+            do_reply = their < mine
+        if not do_reply:
+            # Recorded under queue_lock so send_release_to_all, which clears
+            # requesting under the same lock, can't miss it
+            with self.deferred_lock:
+                self._deferred_mask |= 1 << self._peer_idx[from_id]
+        snapshot = self._queue_snapshot_locked()
+        return partial(self._after_request, ts, from_id, snapshot, do_reply), False
 
+    def _after_request(self, ts, from_id, snapshot, do_reply):
+        view = self._queue_view(snapshot)
+        self.log(f"Received REQUEST from Node {from_id} (ts={ts}) Queue={view}")
         if do_reply:
-            try:
-                proxy = ServerProxy(self.peers[str(from_id)], allow_none=True)
-                proxy.receive_reply(self.clock, self.node_id)
+            # The requester is blocked on this, so send it (with anything
+            # else queued for that peer) right away
+            if self._flush_peer(from_id, [(MSG_REPLY, self.clock)]):
                 self.log(f"Sent REPLY to Node {from_id}")
-            except Exception as e:
-                self.log(f"Error sending REPLY to Node {from_id}: {e}")
         else:
-            with self.deferred_lock:
-                self.deferred.add(str(from_id))
             self.log(f"Deferred REPLY to Node {from_id}")
 
-        return True
+    def _reply_locked(self, ts, from_id):
+        self._update_clock_locked(ts)
+        with self.replies_lock:
+            self._replies_mask |= 1 << self._peer_idx[from_id]
+        return partial(self._after_reply, from_id), True
+
+    def _after_reply(self, from_id):
+        self.log(f"Received REPLY from Node {from_id}. Replies={self._mask_ids(self._replies_mask)}")
+
+    def _release_locked(self, ts, from_id):
+        self._update_clock_locked(ts)
+        self._dequeue_locked(from_id)
+        snapshot = self._queue_snapshot_locked()
+        return partial(self._after_release, from_id, snapshot), True
+
+    def _after_release(self, from_id, snapshot):
+        view = self._queue_view(snapshot)
+        self.log(f"Received RELEASE from Node {from_id}. Queue={view}")
+
+    def receive_batch(self, ops, from_id):
+        from_id = from_id if isinstance(from_id, str) else str(from_id)
+        ops = list(ops)  # a malformed body fails here, before any state changes
+
+        # All ops in the frame are applied under one queue_lock acquisition;
+        # one bad op is logged and skipped rather than dropping the rest
+        followups, wake, errors = [], False, []
+        with self.queue_lock:
+            for method_id, ts in ops:
+                try:
+                    ts = ts if isinstance(ts, int) else int(ts)
+                    followup, notify = self._apply_locked[method_id](ts, from_id)
+                except Exception as e:
+                    errors.append((method_id, e))
+                    continue
+                followups.append(followup)
+                wake = wake or notify
+
+        if wake:
+            with self.cs_cond:
+                self.cs_cond.notify_all()
+        for method_id, e in errors:
+            kind = MSG_NAMES[method_id] if 0 <= method_id < len(MSG_NAMES) else method_id
+            self.log(f"Error handling {kind} from Node {from_id}: {e!r}")
+        for followup in followups:
+            followup()
+
+    def receive_request(self, ts, from_id):
+        self.receive_batch([(MSG_REQUEST, ts)], from_id)
 
     def receive_reply(self, ts, from_id):
-        self.update_clock(ts)
-        with self.replies_lock:
-            self.replies_received.add(str(from_id))
-        self.log(f"Received REPLY from Node {from_id}. Replies={self.replies_received}")
-        return True
+        self.receive_batch([(MSG_REPLY, ts)], from_id)
 
     def receive_release(self, ts, from_id):
-        self.update_clock(ts)
-        with self.queue_lock:
-            self.request_queue = [x for x in self.request_queue if x[1] != str(from_id)]
-        self.log(f"Received RELEASE from Node {from_id}. Queue={self.request_queue}")
-        return True
+        self.receive_batch([(MSG_RELEASE, ts)], from_id)
 
     # ---------------- Core Logic ----------------
+    def _flush_peer(self, pid, extra=()):
+        # Sends the peer's pending outbox plus the caller's own ops in one
+        # frame. Draining under the socket lock keeps frames in FIFO order,
+        # and because the flusher can't take `extra`, the return value says
+        # whether exactly those ops went out.
+        with self._sock_locks[pid]:
+            with self._outbox_lock:
+                ops = self._outbox.pop(pid, [])
+            ops.extend(extra)
+            if not ops:
+                return True
+            body = encode_body(self._frame_prefix, ops)
+            while True:
+                sock = self._sockets.get(pid)
+                if sock is not None and self._peer_closed(sock):
+                    self._drop_socket(pid)
+                    sock = None
+                fresh = sock is None
+                try:
+                    if fresh:
+                        sock = self._sockets[pid] = self._connect(pid)
+                    send_frame(sock, body)
+                    return True
+                except OSError as e:
+                    self._drop_socket(pid)
+                    # A cached connection may just be stale (peer restarted);
+                    # retry once on a new one before giving up
+                    if not fresh:
+                        continue
+                    kinds = "/".join(MSG_NAMES[m] for m, _ in ops)
+                    self.log(f"Error sending {kinds} to Node {pid}: {e}")
+                    return False
+
+    def _connect(self, pid):
+        sock = socket.create_connection(self._peer_addr[pid])
+        # Frames are tiny; don't let Nagle hold them back
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    @staticmethod
+    def _peer_closed(sock):
+        # Peers never write to us, so a readable EOF means they closed their
+        # end; without this check the next frame would vanish into the dead
+        # connection while sendall still succeeds
+        sock.setblocking(False)
+        try:
+            return sock.recv(1, socket.MSG_PEEK) == b""
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+        finally:
+            sock.setblocking(True)
+
+    def _drop_socket(self, pid):
+        sock = self._sockets.pop(pid, None)
+        if sock is not None:
+            sock.close()
+
+    def _flush_all(self):
+        with self._outbox_lock:
+            pids = [pid for pid, ops in self._outbox.items() if ops]
+        if pids:
+            list(self._executor.map(self._flush_peer, pids))
+
+    def _flush_loop(self):
+        while not self._stopping.wait(FLUSH_INTERVAL):
+            self._flush_all()
+
+    def _compile_broadcast(self):
+        # The peer set never changes, so unroll the all-peers broadcast into
+        # straight-line appends under one outbox lock acquisition
+        lines = [
+            "def broadcast_all(method_id, ts):",
+            "    op = (method_id, ts)",
+            "    with outbox_lock:",
+        ]
+        lines += [f"        outbox[{pid!r}].append(op)" for pid in self._peer_ids]
+        if not self._peer_ids:
+            lines.append("        pass")
+        ns = {"outbox": self._outbox, "outbox_lock": self._outbox_lock}
+        exec("\n".join(lines), ns)
+        return ns["broadcast_all"]
+
     def send_request_to_all(self):
-        ts = self.inc_clock()
-        self.own_request_ts = ts
+        # requesting and own_request_ts change together under queue_lock, so
+        # receive_request never sees one without the other
         with self.queue_lock:
-            self.request_queue.append((int(ts), str(self.node_id)))
-            self.request_queue.sort()
+            ts = self._inc_clock_locked()
+            self.own_request_ts = ts
+            self.requesting = True
+            self._enqueue_locked(ts, self.node_id)
         self.log(f"Broadcasting REQUEST ts={ts}")
-
-        for pid, url in self.peers.items():
-            try:
-                proxy = ServerProxy(url, allow_none=True)
-                proxy.receive_request(ts, self.node_id)
-            except Exception as e:
-                self.log(f"Error sending REQUEST to Node {pid}: {e}")
+        self._broadcast_all(MSG_REQUEST, ts)
 
     def send_release_to_all(self):
-        ts = self.inc_clock()
         with self.queue_lock:
-            self.request_queue = [x for x in self.request_queue if x[1] != str(self.node_id)]
+            ts = self._inc_clock_locked()
+            self.requesting = False
+            self._dequeue_locked(self.node_id)
         self.log(f"Broadcasting RELEASE ts={ts}")
 
-        for pid, url in self.peers.items():
-            try:
-                proxy = ServerProxy(url, allow_none=True)
-                proxy.receive_release(ts, self.node_id)
-            except Exception as e:
-                self.log(f"Error sending RELEASE to Node {pid}: {e}")
-
         # Send deferred replies
         with self.deferred_lock:
-            deferred = list(self.deferred)
-            self.deferred.clear()
+            deferred = self._mask_ids(self._deferred_mask)
+            self._deferred_mask = 0
+        release, reply = (MSG_RELEASE, ts), (MSG_REPLY, self.clock)
+        ops = {pid: [release] for pid in self.peers}
         for pid in deferred:
-            try:
-                proxy = ServerProxy(self.peers[pid], allow_none=True)
-                proxy.receive_reply(self.clock, self.node_id)
+            ops[pid].append(reply)
+
+        # RELEASE and the deferred REPLYs are what unblock peers, so send
+        # them now (one frame per peer) instead of waiting for the flusher
+        sent = dict(zip(ops, self._executor.map(self._flush_peer, ops, ops.values())))
+        for pid in deferred:
+            if sent[pid]:
                 self.log(f"Sent deferred REPLY to Node {pid}")
-            except Exception as e:
-                self.log(f"Error sending deferred REPLY to Node {pid}: {e}")
 
     def can_enter_cs(self):
-        with self.replies_lock, self.queue_lock:
-            all_replied = len(self.replies_received) == len(self.peers)
-            smallest = (
-                self.request_queue
-                and self.request_queue[0] == (int(self.own_request_ts), str(self.node_id))
-            )
-            return self.requesting and all_replied and smallest
-
-    def critical_section(self):
+        # Caller holds cs_cond (not queue_lock, which this takes). Reading the
+        # int mask is atomic and it only grows while we wait, so the common
+        # "replies still missing" case skips locking entirely; a stale read
+        # just waits for the next notify.
+        if self._replies_mask != self._all_mask:
+            return False
+        with self.queue_lock:
+            mine = (self.own_request_ts, self.node_id)
+            return self.requesting and self._queue_head_locked() == mine
+
+    def critical_section(self, hold=2):
         self.log(">>> ENTERING CRITICAL SECTION <<<")
-        with open(self.ledger_file, "a") as f:
-            f.write(f"Node {self.node_id} ENTERED CS at {datetime.now()}\n")
-        time.sleep(2)
-        with open(self.ledger_file, "a") as f:
-            f.write(f"Node {self.node_id} EXITING CS at {datetime.now()}\n")
+        os.write(self._ledger_fd, f"Node {self.node_id} ENTERED CS at {datetime.now()}\n".encode())
+        time.sleep(hold)
+        os.write(self._ledger_fd, f"Node {self.node_id} EXITING CS at {datetime.now()}\n".encode())
         self.log("<<< EXITING CRITICAL SECTION >>>")
 
-    def request_cs_and_wait(self):
+    def request_cs_and_wait(self, hold=2):
         with self.replies_lock:
-            self.replies_received = set()
-        self.requesting = True
+            self._replies_mask = 0
         self.send_request_to_all()
         self.log("Waiting for all REPLIES and queue order...")
 
-        while not self.can_enter_cs():
-            time.sleep(0.2)
+        with self.cs_cond:
+            while not self.can_enter_cs():
+                self.cs_cond.wait(timeout=5.0)
 
-        self.critical_section()
+        self.critical_section(hold)
 
-        self.requesting = False
-        self.replies_received = set()
+        self._replies_mask = 0
         self.send_release_to_all()
 
     # ---------------- RPC Server ----------------
     def start_rpc_server(self, host, port):
         def serve():
-            server = SimpleXMLRPCServer((host, port), allow_none=True, logRequests=False)
-            server.register_function(self.receive_request, "receive_request")
-            server.register_function(self.receive_reply, "receive_reply")
-            server.register_function(self.receive_release, "receive_release")
+            server = LamportTCPServer((host, port), self)
             self.server = server
             self.log(f"RPC server started on {host}:{port}")
             server.serve_forever()
@@ -209,14 +534,41 @@ class LamportNode:
         t = threading.Thread(target=serve, daemon=True)
         t.start()
         self.server_thread = t
+        self._flusher.start()
+
+    def stop(self):
+        # Stop the server (and its handler threads) first so nothing can
+        # queue a message after the final flush
+        if self.server:
+            self.server.shutdown()
+            self.server.close_connections()
+            self.server.server_close()
+        self._stopping.set()
+        if self._flusher.is_alive():
+            self._flusher.join()
+        self._flush_all()
+        self._executor.shutdown(wait=True)
+        for sock in self._sockets.values():
+            sock.close()
+        self._sockets.clear()
+        os.close(self._ledger_fd)
+        self._log_listener.stop()
+        for h in self._log_listener.handlers:
+            h.close()
 
     # ---------------- Simulation ----------------
-    def simulate(self, request_count=3, min_delay=2, max_delay=6):
+    def simulate(self, request_count=3, min_delay=2, max_delay=6, cs_time=2):
+        # Whole-second bounds keep the original integer delays; fractional
+        # bounds pick a delay to 0.1s. RPCs are served on other threads meanwhile.
+        whole = float(min_delay).is_integer() and float(max_delay).is_integer()
         for i in range(request_count):
-            delay = random.randint(min_delay, max_delay)
+            if whole:
+                delay = random.randint(int(min_delay), int(max_delay))
+            else:
+                delay = round(random.uniform(min_delay, max_delay), 1)
             self.log(f"Sleeping {delay}s before CS request {i+1}/{request_count}")
             time.sleep(delay)
-            self.request_cs_and_wait()
+            self.request_cs_and_wait(hold=cs_time)
         self.log("Simulation complete.")
 
 # ---------------- Helpers ----------------
@@ -224,11 +576,29 @@ def read_config(path):
     with open(path, "r") as f:
         return json.load(f)
 
+def parse_host_port(url, node_id):
+    parts = urlsplit(url)
+    try:
+        host, port = parts.hostname, parts.port
+    except ValueError:
+        host = port = None
+    if host is None or port is None:
+        raise ValueError(
+            f"Node {node_id}: invalid URL {url!r} in config, expected http://host:port"
+        )
+    return host, port
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--id", required=True)
     parser.add_argument("--config", required=True)
     parser.add_argument("--requests", type=int, default=3)
+    parser.add_argument("--min-delay", type=float, default=2,
+                        help="minimum seconds to wait between CS requests")
+    parser.add_argument("--max-delay", type=float, default=6,
+                        help="maximum seconds to wait between CS requests")
+    parser.add_argument("--cs-time", type=float, default=2,
+                        help="seconds to hold the critical section")
     args = parser.parse_args()
 
     cfg = read_config(args.config)
@@ -238,14 +608,23 @@ def main():
         sys.exit(1)
 
     url = cfg[node_id]
-    parts = url.replace("http://", "").split(":")
-    host = parts[0]
-    port = int(parts[1])
-
-    node = LamportNode(node_id, url, cfg)
+    try:
+        host, port = parse_host_port(url, node_id)
+        node = LamportNode(node_id, url, cfg)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
     node.start_rpc_server(host, port)
     time.sleep(1)
-    node.simulate(request_count=args.requests)
+    try:
+        node.simulate(
+            request_count=args.requests,
+            min_delay=args.min_delay,
+            max_delay=args.max_delay,
+            cs_time=args.cs_time,
+        )
+    finally:
+        node.stop()
 
 if __name__ == "__main__":
     main()